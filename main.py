@@ -1,6 +1,7 @@
 
+import textwrap
 from telegram import (
-    Update, 
+    Update,
     InlineKeyboardButton, 
     InlineKeyboardMarkup
 )
@@ -9,8 +10,9 @@ from telegram.ext import (
     ContextTypes, filters, CallbackQueryHandler
 )
 from telegram.constants import ParseMode
+from telegram.request import HTTPXRequest
 from decouple import config
-from utils.FileUploadBot.FileUpload import FileUploadBot
+from utils.FileUploadBot.FileUpload import CLIENT, bot_instance
 from utils.FileUploadBot.utils import (
     ping_command, help_command, handle_callback, handle_url
 )
@@ -19,35 +21,35 @@ from utils.constants import (
 )
 
 BOT_TOKEN = config("API_KEY")
+WEBHOOK_URL = config("WEBHOOK_URL", default="")
+WEBHOOK_PORT = config("WEBHOOK_PORT", default=8443, cast=int)
 
 # Messages
 CANCEL_MESSAGE = "❌ **Download Cancelled**\n🗑️ Operation stopped by user"
 
-bot_instance = FileUploadBot()
+# Dedented once at import instead of per /start
+WELCOME_TEXT = textwrap.dedent("""\
+    🚀 **Advanced File Upload Bot**
+
+    📤 **What I can do:**
+    • Upload files directly to Telegram from any URL
+    • Support for photos, videos, audio, and documents
+    • Smart file type detection
+    • Real-time progress tracking with download speed
+    • Cancel downloads anytime with one click
+    • File size validation (up to 2GB)
+    • No local storage - files stream directly to Telegram
+
+    📋 **How to use:**
+    • Send me any direct file URL
+    • I'll analyze it and upload it optimally
+    • Use /info <url> to check file details first
+    • Use /help for more commands
+
+    💡 **Pro tip:** I work with direct download links, file sharing services, and most public URLs!""")
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start command with rich welcome message"""
-    welcome_text = """
-        🚀 **Advanced File Upload Bot**
-
-        📤 **What I can do:**
-        • Upload files directly to Telegram from any URL
-        • Support for photos, videos, audio, and documents
-        • Smart file type detection
-        • Real-time progress tracking with download speed
-        • Cancel downloads anytime with one click
-        • File size validation (up to 2GB)
-        • No local storage - files stream directly to Telegram
-
-        📋 **How to use:**
-        • Send me any direct file URL
-        • I'll analyze it and upload it optimally
-        • Use /info <url> to check file details first
-        • Use /help for more commands
-
-        💡 **Pro tip:** I work with direct download links, file sharing services, and most public URLs!
-    """
-    
     keyboard = [
         [InlineKeyboardButton("📖 Help", callback_data="help"),
          InlineKeyboardButton("ℹ️ About", callback_data="about")]
@@ -55,7 +57,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await update.message.reply_text(
-        welcome_text.strip(),
+        WELCOME_TEXT,
         parse_mode=ParseMode.MARKDOWN,
         reply_markup=reply_markup
     )
@@ -101,7 +103,27 @@ async def info_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await status_msg.edit_text(info_text.strip(), parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
-app = ApplicationBuilder().token(BOT_TOKEN).build()
+async def close_client(application):
+    """Close the shared httpx client when the bot shuts down"""
+    await CLIENT.aclose()
+
+# Wide pool and long read/write timeouts so status edits don't queue
+# behind multi-minute file uploads on the default single connection
+api_request = HTTPXRequest(
+    connection_pool_size=256,
+    pool_timeout=30.0,
+    read_timeout=600.0,
+    write_timeout=600.0
+)
+
+app = (
+    ApplicationBuilder()
+    .token(BOT_TOKEN)
+    .request(api_request)
+    .get_updates_request(HTTPXRequest(connection_pool_size=16))
+    .post_shutdown(close_client)
+    .build()
+)
 
 app.add_handler(CommandHandler("start", start))
 app.add_handler(CommandHandler("help", help_command))
@@ -113,4 +135,15 @@ app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_url))
 print("🚀 Advanced File Upload Bot is running...")
 print("📤 Features: Smart upload, progress tracking, multiple formats")
 print("💾 Zero local storage - all files streamed directly to Telegram")
-app.run_polling()
+
+if WEBHOOK_URL:
+    # Telegram pushes updates directly instead of the getUpdates long-poll,
+    # so bursts of button presses are dispatched without polling latency
+    app.run_webhook(
+        listen="0.0.0.0",
+        port=WEBHOOK_PORT,
+        url_path=BOT_TOKEN,
+        webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{BOT_TOKEN}"
+    )
+else:
+    app.run_polling()
@@ -1,17 +1,29 @@
-from urllib.parse import urlparse, unquote
+from collections import OrderedDict
+from urllib.parse import urlparse, unquote, parse_qs
 import httpx
 import time
 from utils.constants import (
-    PHOTO_TYPES, 
-    VIDEO_TYPES, 
-    AUDIO_TYPES
+    EXT_TO_TYPE,
+    MIME_PREFIX_TO_TYPE
 )
 from utils.utils import logger
 
+# Shared client reused across requests: keep-alive skips the per-request
+# DNS/TCP/TLS setup and HTTP/2 multiplexes redirect-heavy CDN chains
+CLIENT = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    timeout=httpx.Timeout(300.0, connect=10.0)
+)
+
+URL_INFO_CACHE_TTL = 60.0  # seconds
+URL_INFO_CACHE_SIZE = 512
+
 class FileUploadBot:
     def __init__(self):
         self.active_downloads = {}
-        self.cancel_requests = set()  # Track cancel requests
+        self.cancel_events = {}  # user_id -> asyncio.Event set on cancel
+        self.url_info_cache = OrderedDict()  # url -> (expiry, info)
     
     def create_progress_bar(self, percentage, length=20):
         """Create a visual progress bar"""
@@ -21,14 +33,12 @@ class FileUploadBot:
     
     def format_file_size(self, size_bytes):
         """Convert bytes to human readable format"""
-        if size_bytes == 0:
+        size_bytes = int(size_bytes)
+        if size_bytes <= 0:
             return "0 B"
-        size_names = ["B", "KB", "MB", "GB"]
-        i = 0
-        while size_bytes >= 1024.0 and i < len(size_names) - 1:
-            size_bytes /= 1024.0
-            i += 1
-        return f"{size_bytes:.1f} {size_names[i]}"
+        # bit_length picks the unit directly, so one division replaces the loop
+        i = min((size_bytes.bit_length() - 1) // 10, 3)
+        return f"{size_bytes / (1 << (10 * i)):.1f} {('B', 'KB', 'MB', 'GB')[i]}"
     
     def extract_filename_from_url(self, url):
         """Extract filename from URL with better logic"""
@@ -38,16 +48,15 @@ class FileUploadBot:
             path = unquote(parsed.path)
             
             # Get filename from path
-            filename = path.split('/')[-1]
+            filename = path.rpartition('/')[2]
             
             # If no filename in path, try to extract from query params
             if not filename or '.' not in filename:
-                # Check common query parameters
-                query_params = parsed.query
-                for param in ['filename', 'file', 'name']:
+                # Check common query parameters (parse_qs unquotes values)
+                query_params = parse_qs(parsed.query)
+                for param in ('filename', 'file', 'name'):
                     if param in query_params:
-                        filename = query_params.split(f'{param}=')[1].split('&')[0]
-                        filename = unquote(filename)
+                        filename = query_params[param][0]
                         break
             
             # If still no filename, generate one
@@ -60,44 +69,55 @@ class FileUploadBot:
     
     def get_file_type(self, filename, content_type=None):
         """Determine file type for optimal Telegram upload"""
-        ext = '.' + filename.lower().split('.')[-1] if '.' in filename else ''
-        
-        # Check by extension first
-        if ext in PHOTO_TYPES:
-            return 'photo'
-        elif ext in VIDEO_TYPES:
-            return 'video'
-        elif ext in AUDIO_TYPES:
-            return 'audio'
-        
-        # Check by content type if extension doesn't match
-        if content_type:
-            if content_type.startswith('image/'):
-                return 'photo'
-            elif content_type.startswith('video/'):
-                return 'video'
-            elif content_type.startswith('audio/'):
-                return 'audio'
-        
-        return 'document'
+        sep, tail = filename.lower().rpartition('.')[1:]
+        ext = '.' + tail if sep else ''
+
+        # Check by extension first, then fall back to the MIME prefix
+        file_type = EXT_TO_TYPE.get(ext)
+        if file_type:
+            return file_type
+
+        mime_prefix = content_type.split('/', 1)[0] if content_type else ''
+        return MIME_PREFIX_TO_TYPE.get(mime_prefix, 'document')
     
     async def check_url_info(self, url):
         """Get file info without downloading the entire file"""
+        # Serve from cache so the preview -> upload-button flow only
+        # pays the HEAD round-trip once per URL
+        cached = self.url_info_cache.get(url)
+        if cached and cached[0] > time.monotonic():
+            self.url_info_cache.move_to_end(url)
+            return cached[1]
+
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.head(url, follow_redirects=True)
-                if response.status_code != 200:
-                    # If HEAD fails, try GET with range
-                    response = await client.get(url, headers={'Range': 'bytes=0-1'})
-                
-                content_length = response.headers.get('content-length')
-                content_type = response.headers.get('content-type', '')
-                
-                return {
-                    'size': int(content_length) if content_length else None,
-                    'content_type': content_type,
-                    'url': str(response.url)  # Final URL after redirects
-                }
+            response = await CLIENT.head(url, follow_redirects=True, timeout=10.0)
+            if response.status_code in (405, 501):
+                # Server doesn't implement HEAD, try GET with range
+                response = await CLIENT.get(
+                    url, headers={'Range': 'bytes=0-1'},
+                    follow_redirects=True, timeout=10.0
+                )
+
+            content_length = response.headers.get('content-length')
+            content_type = response.headers.get('content-type', '')
+
+            info = {
+                'size': int(content_length) if content_length else None,
+                'content_type': content_type,
+                'url': str(response.url)  # Final URL after redirects
+            }
+
+            self.url_info_cache[url] = (time.monotonic() + URL_INFO_CACHE_TTL, info)
+            self.url_info_cache.move_to_end(url)
+            while len(self.url_info_cache) > URL_INFO_CACHE_SIZE:
+                self.url_info_cache.popitem(last=False)
+
+            return info
         except Exception as e:
             logger.error(f"Error checking URL info: {e}")
             return None
+
+
+# Shared singleton so handlers in main.py and utils.py see the same
+# active-download and cancel state
+bot_instance = FileUploadBot()
@@ -1,8 +1,10 @@
 import asyncio
-import io
+import html
 import re
+import tempfile
+import textwrap
 import time
-import httpx
+from datetime import datetime
 from telegram.constants import ParseMode, ChatAction
 from telegram import (
     Update, 
@@ -13,7 +15,7 @@ from telegram import (
 from telegram.ext import (
     ContextTypes
 )
-from utils.FileUploadBot.FileUpload import FileUploadBot
+from utils.FileUploadBot.FileUpload import CLIENT, bot_instance
 from utils.utils import logger
 from utils.constants import (
     MAX_FILE_SIZE, 
@@ -21,13 +23,111 @@ from utils.constants import (
     CANCEL_MESSAGE
 )
 
-bot_instance = FileUploadBot()
+# Compiled once; \S+ also rejects URLs with embedded whitespace
+URL_PATTERN = re.compile(r'https?://\S+$')
+
+PROGRESS_INTERVAL = 3.0  # Seconds between progress message edits
+
+# At most this many downloads run at once across all users
+DOWNLOAD_SEM = asyncio.Semaphore(4)
+
+# Latest download snapshot per user: user_id -> (downloaded, total_size, start_time)
+progress_state = {}
+
+# Static message bodies, dedented once at import instead of per call
+HELP_TEXT = textwrap.dedent("""\
+    📚 **Available Commands:**
+
+    🔸 `/start` - Show welcome message
+    🔸 `/help` - Show this help
+    🔸 `/info <url>` - Get file information without downloading
+    🔸 `/ping` - Check bot status
+
+    📤 **Supported File Types:**
+    • **Photos:** JPG, PNG, GIF, WebP, BMP, TIFF
+    • **Videos:** MP4, AVI, MOV, MKV, WebM, M4V
+    • **Audio:** MP3, WAV, FLAC, OGG, AAC, M4A
+    • **Documents:** Any other file type
+
+    ⚠️ **Limitations:**
+    • Maximum file size: 2GB
+    • Photos: Up to 10MB for best quality
+    • Files are streamed directly (no local storage)
+    • Progress updates every 2 seconds
+
+    🌐 **Supported URLs:**
+    • Direct download links
+    • Most file sharing services
+    • Public cloud storage links
+    • CDN hosted files""")
+
+ABOUT_TEXT = textwrap.dedent("""\
+    🤖 **Advanced File Upload Bot**
+
+    **Version:** 2.0
+    **Developer:** Custom Bot
+    **Features:**
+    • Zero local storage
+    • Smart file type detection
+    • Real-time progress tracking
+    • Cancel downloads anytime
+    • Error handling
+    • Multiple format support
+
+    **Tech Stack:**
+    • Python 3.8+
+    • python-telegram-bot
+    • httpx for async HTTP
+    • Streaming file processing""")
+
+async def progress_reporter(status_msg, user_id, filename, file_type, cancel_markup):
+    """Report download progress on a fixed cadence, decoupled from the chunk loop"""
+    # HTML parse mode with an escaped filename: underscores and other
+    # Markdown-special characters in URLs no longer break the edit
+    escaped_name = html.escape(filename)
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        snapshot = progress_state.get(user_id)
+        if snapshot is None:
+            continue
+        downloaded, total_size, start_time = snapshot
+        current_time = time.monotonic()
+        speed = downloaded / (current_time - start_time) if current_time > start_time else 0
+
+        if total_size > 0:
+            percentage = (downloaded / total_size) * 100
+            progress_bar = bot_instance.create_progress_bar(percentage)
+            eta = (total_size - downloaded) / speed if speed > 0 else 0
+
+            status_text = (
+                f"📤 <b>Downloading {file_type}...</b>\n\n"
+                f"📄 <code>{escaped_name}</code>\n"
+                f"📏 {bot_instance.format_file_size(downloaded)} / {bot_instance.format_file_size(total_size)}\n"
+                f"{progress_bar}\n"
+                f"⚡ Speed: {bot_instance.format_file_size(speed)}/s\n"
+                f"⏱️ ETA: {int(eta)}s remaining"
+            )
+        else:
+            # Unknown size
+            status_text = (
+                f"📤 <b>Downloading {file_type}...</b>\n\n"
+                f"📄 <code>{escaped_name}</code>\n"
+                f"📏 {bot_instance.format_file_size(downloaded)} downloaded\n"
+                f"⚡ Speed: {bot_instance.format_file_size(speed)}/s\n"
+                f"📡 Size unknown - streaming..."
+            )
+
+        try:
+            await status_msg.edit_text(status_text, parse_mode=ParseMode.HTML, reply_markup=cancel_markup)
+        except Exception:
+            # Ignore edit errors (rate limiting, etc.)
+            pass
 
 async def ping_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Check bot status"""
-    start_time = time.time()
+    start_time = time.monotonic()
     msg = await update.message.reply_text("🏓 Pong!")
-    end_time = time.time()
+    end_time = time.monotonic()
     
     response_time = (end_time - start_time) * 1000
     await msg.edit_text(f"🏓 Pong!\n⚡ Response time: {response_time:.0f}ms")
@@ -37,7 +137,7 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     url = update.message.text.strip()
     
     # Validate URL
-    if not re.match(r'https?://.+', url):
+    if not URL_PATTERN.match(url):
         await update.message.reply_text("❌ Please send a valid URL starting with http:// or https://")
         return
     
@@ -51,7 +151,14 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Send initial status
     status_msg = await update.message.reply_text("🔍 Analyzing file...")
     bot_instance.active_downloads[user_id] = True
-    
+    bot_instance.cancel_events[user_id] = asyncio.Event()
+
+    # Run in the background so the handler returns immediately and the
+    # update queue keeps draining while downloads are in flight
+    context.application.create_task(run_download(url, status_msg, update, context, user_id))
+
+async def run_download(url, status_msg, update, context, user_id):
+    """Resolve the URL and run the download as a bounded background task"""
     try:
         # Check file info
         info = await bot_instance.check_url_info(url)
@@ -70,22 +177,28 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
         
-        # Update status with file info and cancel button
-        cancel_keyboard = [[InlineKeyboardButton("❌ Cancel Download", callback_data=f"cancel:{user_id}")]]
-        cancel_markup = InlineKeyboardMarkup(cancel_keyboard)
-        
-        await status_msg.edit_text(
-            f"📤 Uploading {file_type}...\n"
-            f"📄 {filename}\n"
-            f"📏 {bot_instance.format_file_size(info['size']) if info['size'] else 'Unknown size'}",
-            reply_markup=cancel_markup
-        )
-        
-        # Send typing action
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.UPLOAD_DOCUMENT)
-        
-        # Download and upload file with progress
-        await download_with_progress(info['url'], info, filename, file_type, status_msg, update, context, user_id)
+        # Bound concurrent downloads so N users can't each pin a
+        # connection and a spool at once
+        async with DOWNLOAD_SEM:
+            # Update status with file info and cancel button
+            cancel_keyboard = [[InlineKeyboardButton("❌ Cancel Download", callback_data=f"cancel:{user_id}")]]
+            cancel_markup = InlineKeyboardMarkup(cancel_keyboard)
+
+            await status_msg.edit_text(
+                f"📤 Uploading {file_type}...\n"
+                f"📄 {filename}\n"
+                f"📏 {bot_instance.format_file_size(info['size']) if info['size'] else 'Unknown size'}",
+                reply_markup=cancel_markup
+            )
+
+            # Send typing action
+            await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.UPLOAD_DOCUMENT)
+
+            # Download and upload file with progress
+            await download_with_progress(
+                info['url'], info, filename, file_type, status_msg,
+                update, context, user_id, cancel_markup
+            )
     
     except asyncio.TimeoutError:
         await status_msg.edit_text("❌ Upload timeout. The file might be too large or the server is slow.")
@@ -97,166 +210,110 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Clean up
         if user_id in bot_instance.active_downloads:
             del bot_instance.active_downloads[user_id]
-        # Remove any pending cancel requests
-        bot_instance.cancel_requests.discard(user_id)
+        # Remove any pending cancel event
+        bot_instance.cancel_events.pop(user_id, None)
 
-async def download_with_progress(url, info, filename, file_type, status_msg, update, context, user_id):
+async def download_with_progress(url, info, filename, file_type, status_msg, update, context, user_id, cancel_markup):
     """Download file with progress tracking and cancel support"""
-    async with httpx.AsyncClient(timeout=300.0) as client:
-        async with client.stream('GET', url) as response:
-            if response.status_code != 200:
-                await status_msg.edit_text(f"❌ Failed to download file (HTTP {response.status_code})")
-                return
-            
-            file_data = io.BytesIO()
-            downloaded = 0
-            total_size = info.get('size', 0)
-            last_update_time = time.time()
-            start_time = time.time()
-            
-            # Create cancel button
-            cancel_keyboard = [[InlineKeyboardButton("❌ Cancel Download", callback_data=f"cancel:{user_id}")]]
-            cancel_markup = InlineKeyboardMarkup(cancel_keyboard)
-            
-            async for chunk in response.aiter_bytes(chunk_size=8192):
-                # Check for cancellation first (before processing chunk)
-                if user_id in bot_instance.cancel_requests:
+    async with CLIENT.stream('GET', url) as response:
+        if response.status_code != 200:
+            await status_msg.edit_text(f"❌ Failed to download file (HTTP {response.status_code})")
+            return
+        
+        # Spool small files in memory, spill bigger ones to disk so only
+        # one chunk lives in RAM at a time instead of the whole file
+        file_data = tempfile.SpooledTemporaryFile(max_size=8 << 20)
+        downloaded = 0
+        total_size = info.get('size', 0)
+        start_time = time.monotonic()
+
+        # Progress edits run in their own task so Telegram API latency
+        # never stalls the chunk loop
+        reporter = asyncio.create_task(
+            progress_reporter(status_msg, user_id, filename, file_type, cancel_markup)
+        )
+        cancel_event = bot_instance.cancel_events.setdefault(user_id, asyncio.Event())
+
+        try:
+            async for chunk in response.aiter_bytes(chunk_size=1 << 20):
+                # One cancellation check per chunk
+                if cancel_event.is_set():
                     logger.info(f"Cancellation detected for user {user_id} during download")
                     await status_msg.edit_text(CANCEL_MESSAGE, parse_mode=ParseMode.MARKDOWN)
-                    bot_instance.cancel_requests.discard(user_id)
+                    file_data.close()
                     return
-                
+
                 file_data.write(chunk)
                 downloaded += len(chunk)
-                
-                # Check for cancellation again after writing chunk
-                if user_id in bot_instance.cancel_requests:
-                    logger.info(f"Cancellation detected for user {user_id} after chunk write")
-                    await status_msg.edit_text(CANCEL_MESSAGE, parse_mode=ParseMode.MARKDOWN)
-                    bot_instance.cancel_requests.discard(user_id)
-                    return
-                
-                # Update progress every 2 seconds or when download completes
-                current_time = time.time()
-                if current_time - last_update_time >= 2.0 or downloaded == total_size:
-                    last_update_time = current_time
-                    
-                    if total_size > 0:
-                        percentage = (downloaded / total_size) * 100
-                        progress_bar = bot_instance.create_progress_bar(percentage)
-                        speed = downloaded / (current_time - start_time) if current_time > start_time else 0
-                        eta = (total_size - downloaded) / speed if speed > 0 else 0
-                        
-                        status_text = f"""📤 **Downloading {file_type}...**
-
-                        📄 `{filename}`
-                        📏 {bot_instance.format_file_size(downloaded)} / {bot_instance.format_file_size(total_size)}
-                        {progress_bar}
-                        ⚡ Speed: {bot_instance.format_file_size(speed)}/s
-                        ⏱️ ETA: {int(eta)}s remaining"""
-                    else:
-                        # Unknown size
-                        speed = downloaded / (current_time - start_time) if current_time > start_time else 0
-                        status_text = f"""📤 **Downloading {file_type}...**
-
-                        📄 `{filename}`
-                        📏 {bot_instance.format_file_size(downloaded)} downloaded
-                        ⚡ Speed: {bot_instance.format_file_size(speed)}/s
-                        📡 Size unknown - streaming..."""
-                    
-                    try:
-                        await status_msg.edit_text(status_text.strip(), parse_mode=ParseMode.MARKDOWN, reply_markup=cancel_markup)
-                    except Exception:
-                        # Ignore edit errors (rate limiting, etc.)
-                        pass
-            
-            # Check for cancellation before upload
-            if user_id in bot_instance.cancel_requests:
-                await status_msg.edit_text(CANCEL_MESSAGE, parse_mode=ParseMode.MARKDOWN)
-                bot_instance.cancel_requests.discard(user_id)
-                return
-            
-            # Upload phase
-            await status_msg.edit_text("📤 **Uploading to Telegram...**\n⚡ Processing file...")
-            
-            file_data.seek(0)
-            input_file = InputFile(file_data, filename=filename)
-            
-            # Upload based on file type
-            caption = f"📄 {filename}\n📏 {bot_instance.format_file_size(len(file_data.getvalue()))}\n🕐 {datetime.now().strftime('%H:%M:%S')}"
-            
-            if file_type == 'photo' and len(file_data.getvalue()) <= MAX_PHOTO_SIZE:
-                await context.bot.send_photo(
-                    chat_id=update.effective_chat.id,
-                    photo=input_file,
-                    caption=caption,
-                    reply_to_message_id=update.message.message_id
-                )
-            elif file_type == 'video':
-                await context.bot.send_video(
-                    chat_id=update.effective_chat.id,
-                    video=input_file,
-                    caption=caption,
-                    reply_to_message_id=update.message.message_id
-                )
-            elif file_type == 'audio':
-                await context.bot.send_audio(
-                    chat_id=update.effective_chat.id,
-                    audio=input_file,
-                    caption=caption,
-                    reply_to_message_id=update.message.message_id
-                )
-            else:
-                await context.bot.send_document(
-                    chat_id=update.effective_chat.id,
-                    document=input_file,
-                    caption=caption,
-                    reply_to_message_id=update.message.message_id
-                )
-            
-            # Delete status message and send success
-            await status_msg.delete()
-            
-            total_time = time.time() - start_time
-            await update.message.reply_text(
-                f"✅ **Upload Complete!**\n"
-                f"📁 File type: {file_type.title()}\n"
-                f"📏 Size: {bot_instance.format_file_size(len(file_data.getvalue()))}\n"
-                f"⏱️ Total time: {int(total_time)}s\n"
-                f"⚡ Avg speed: {bot_instance.format_file_size(len(file_data.getvalue()) / total_time)}/s"
-            )
+                progress_state[user_id] = (downloaded, total_size, start_time)
+        finally:
+            reporter.cancel()
+            progress_state.pop(user_id, None)
 
+        # Check for cancellation before upload
+        if cancel_event.is_set():
+            await status_msg.edit_text(CANCEL_MESSAGE, parse_mode=ParseMode.MARKDOWN)
+            file_data.close()
+            return
+        
+        # Upload phase
+        await status_msg.edit_text("📤 **Uploading to Telegram...**\n⚡ Processing file...")
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show help information"""
-    help_text = """
-    📚 **Available Commands:**
+        total_bytes = file_data.tell()
+        file_data.seek(0)
+        # read_file_handle=False keeps the handle open so httpx streams the
+        # multipart body from the spool instead of reading it into bytes
+        input_file = InputFile(file_data, filename=filename, read_file_handle=False)
 
-    🔸 `/start` - Show welcome message
-    🔸 `/help` - Show this help
-    🔸 `/info <url>` - Get file information without downloading
-    🔸 `/ping` - Check bot status
+        # Upload based on file type
+        caption = f"📄 {filename}\n📏 {bot_instance.format_file_size(total_bytes)}\n🕐 {datetime.now().strftime('%H:%M:%S')}"
 
-    📤 **Supported File Types:**
-    • **Photos:** JPG, PNG, GIF, WebP, BMP, TIFF
-    • **Videos:** MP4, AVI, MOV, MKV, WebM, M4V
-    • **Audio:** MP3, WAV, FLAC, OGG, AAC, M4A
-    • **Documents:** Any other file type
+        if file_type == 'photo' and total_bytes <= MAX_PHOTO_SIZE:
+            await context.bot.send_photo(
+                chat_id=update.effective_chat.id,
+                photo=input_file,
+                caption=caption,
+                reply_to_message_id=update.message.message_id
+            )
+        elif file_type == 'video':
+            await context.bot.send_video(
+                chat_id=update.effective_chat.id,
+                video=input_file,
+                caption=caption,
+                reply_to_message_id=update.message.message_id
+            )
+        elif file_type == 'audio':
+            await context.bot.send_audio(
+                chat_id=update.effective_chat.id,
+                audio=input_file,
+                caption=caption,
+                reply_to_message_id=update.message.message_id
+            )
+        else:
+            await context.bot.send_document(
+                chat_id=update.effective_chat.id,
+                document=input_file,
+                caption=caption,
+                reply_to_message_id=update.message.message_id
+            )
+        
+        # Delete status message and send success
+        await status_msg.delete()
+        file_data.close()
 
-    ⚠️ **Limitations:**
-    • Maximum file size: 2GB
-    • Photos: Up to 10MB for best quality
-    • Files are streamed directly (no local storage)
-    • Progress updates every 2 seconds
+        total_time = time.monotonic() - start_time
+        await update.message.reply_text(
+            f"✅ **Upload Complete!**\n"
+            f"📁 File type: {file_type.title()}\n"
+            f"📏 Size: {bot_instance.format_file_size(total_bytes)}\n"
+            f"⏱️ Total time: {int(total_time)}s\n"
+            f"⚡ Avg speed: {bot_instance.format_file_size(total_bytes / total_time)}/s"
+        )
 
-    🌐 **Supported URLs:**
-    • Direct download links
-    • Most file sharing services
-    • Public cloud storage links
-    • CDN hosted files
-    """
-    
-    await update.message.reply_text(help_text.strip(), parse_mode=ParseMode.MARKDOWN)
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show help information"""
+    await update.message.reply_text(HELP_TEXT, parse_mode=ParseMode.MARKDOWN)
 
 
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -267,26 +324,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if query.data == "help":
         await help_command(update, context)
     elif query.data == "about":
-        about_text = """
-🤖 **Advanced File Upload Bot**
-
-    **Version:** 2.0
-    **Developer:** Custom Bot
-    **Features:** 
-    • Zero local storage
-    • Smart file type detection
-    • Real-time progress tracking
-    • Cancel downloads anytime
-    • Error handling
-    • Multiple format support
-
-    **Tech Stack:**
-    • Python 3.8+
-    • python-telegram-bot
-    • httpx for async HTTP
-    • In-memory file processing
-        """
-        await query.edit_message_text(about_text.strip(), parse_mode=ParseMode.MARKDOWN)
+        await query.edit_message_text(ABOUT_TEXT, parse_mode=ParseMode.MARKDOWN)
     elif query.data.startswith("upload:"):
         url = query.data[7:]  # Remove "upload:" prefix
         # Simulate URL message for upload
@@ -299,9 +337,11 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Check if this user is requesting cancellation
         if query.from_user.id == user_id:
-            # Add to cancel requests immediately
-            bot_instance.cancel_requests.add(user_id)
-            logger.info(f"Added user {user_id} to cancel requests")
+            # Signal the download loop immediately
+            cancel_event = bot_instance.cancel_events.get(user_id)
+            if cancel_event:
+                cancel_event.set()
+            logger.info(f"Set cancel event for user {user_id}")
             
             # Provide immediate feedback
             await query.edit_message_text(
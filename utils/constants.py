@@ -6,3 +6,11 @@ CANCEL_MESSAGE = "❌ **Download Cancelled**\n🗑️ Operation stopped by user"
 PHOTO_TYPES = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff'}
 VIDEO_TYPES = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v', '.3gp'}
 AUDIO_TYPES = {'.mp3', '.wav', '.flac', '.ogg', '.aac', '.m4a', '.wma'}
+
+# Flattened lookups so file-type detection is a single dict hit
+EXT_TO_TYPE = (
+    {ext: 'photo' for ext in PHOTO_TYPES}
+    | {ext: 'video' for ext in VIDEO_TYPES}
+    | {ext: 'audio' for ext in AUDIO_TYPES}
+)
+MIME_PREFIX_TO_TYPE = {'image': 'photo', 'video': 'video', 'audio': 'audio'}